@@ -2,12 +2,13 @@ import unittest
 from unittest.mock import patch, MagicMock
 import json
 import sys
+import time
 import os
 
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, parse_llm_response, create_bug_finding_prompt, is_valid_syntax
+from app import app, parse_llm_response, create_bug_finding_prompt, is_valid_syntax, parse_sample_rate, request_counts
 
 class TestBugIdentifierAPI(unittest.TestCase):
     
@@ -15,6 +16,7 @@ class TestBugIdentifierAPI(unittest.TestCase):
         """Set up test client"""
         self.app = app.test_client()
         self.app.testing = True
+        request_counts.clear()
     
     def test_health_endpoint(self):
         """Test the health check endpoint"""
@@ -182,6 +184,100 @@ class TestBugIdentifierAPI(unittest.TestCase):
         # JavaScript (basic check)
         self.assertTrue(is_valid_syntax("function test() { return true; }", "javascript"))
     
+    @patch('app.PROFILE_ADMIN_TOKEN', 'secret')
+    @patch('app.model.generate_content')
+    def test_find_bug_profiled_request(self, mock_generate):
+        """Test profiling a find-bug request via the X-Profile header"""
+        def slow_response(prompt):
+            time.sleep(0.05)
+            mock_response = MagicMock()
+            mock_response.text = '{"bug_type": "Logic Bug", "description": "d", "suggestion": "s"}'
+            return mock_response
+        mock_generate.side_effect = slow_response
+        admin_headers = {'X-Profile-Token': 'secret'}
+        self.app.delete('/admin/profile', headers=admin_headers)
+
+        response = self.app.post('/find-bug',
+                                json={
+                                    'language': 'python',
+                                    'code': 'def is_even(n):\n    return n % 2 == 1'
+                                },
+                                headers={'X-Profile': '1', **admin_headers})
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers.get('X-Profile-Id')
+        self.assertIsNotNone(profile_id)
+
+        # Per-request profile carries the pipeline stage timings
+        response = self.app.get(f'/admin/profile?id={profile_id}&format=json',
+                                headers=admin_headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        for name in ('validate', 'syntax_check', 'prompt', 'llm', 'parse', 'serialize'):
+            self.assertIn(name, data['stages'])
+        self.assertGreater(data['sample_count'], 0)
+
+        # Aggregated collapsed stacks are tagged with the stage
+        response = self.app.get('/admin/profile', headers=admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('stage:llm;', response.get_data(as_text=True))
+
+    @patch('app.PROFILE_SAMPLE_RATE', 0)
+    def test_find_bug_not_profiled_by_default(self):
+        """Test that requests are not profiled without sampling or a token"""
+        response = self.app.post('/find-bug',
+                                json={'language': 'python', 'code': ''})
+        self.assertNotIn('X-Profile-Id', response.headers)
+
+        # The header alone is ignored without the admin token
+        with patch('app.PROFILE_ADMIN_TOKEN', 'secret'):
+            response = self.app.post('/find-bug',
+                                    json={'language': 'python', 'code': ''},
+                                    headers={'X-Profile': '1'})
+        self.assertNotIn('X-Profile-Id', response.headers)
+
+    @patch('app.PROFILE_SAMPLE_RATE', 1.0)
+    def test_find_bug_sampled_request(self):
+        """Test that the sample rate profiles requests without any header"""
+        response = self.app.post('/find-bug',
+                                json={'language': 'python', 'code': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('X-Profile-Id', response.headers)
+
+    @patch('app.RATE_LIMIT_REQUESTS', 0)
+    @patch('app.PROFILE_SAMPLE_RATE', 1.0)
+    def test_rate_limited_request_not_profiled(self):
+        """Test that requests rejected with 429 are not recorded"""
+        response = self.app.post('/find-bug',
+                                json={'language': 'python', 'code': 'x = 1'})
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('X-Profile-Id', response.headers)
+
+    def test_admin_profile_access_denied(self):
+        """Test admin profile endpoint is hidden or forbidden without the token"""
+        with patch('app.PROFILE_ADMIN_TOKEN', ''):
+            response = self.app.get('/admin/profile')
+            self.assertEqual(response.status_code, 404)
+        with patch('app.PROFILE_ADMIN_TOKEN', 'secret'):
+            response = self.app.get('/admin/profile')
+            self.assertEqual(response.status_code, 403)
+            response = self.app.delete('/admin/profile',
+                                      headers={'X-Profile-Token': 'wrong'})
+            self.assertEqual(response.status_code, 403)
+
+    @patch('app.PROFILE_ADMIN_TOKEN', 'secret')
+    def test_admin_profile_unknown_id(self):
+        """Test admin profile endpoint with an unknown profile id"""
+        response = self.app.get('/admin/profile?id=missing',
+                                headers={'X-Profile-Token': 'secret'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_parse_sample_rate(self):
+        """Test sample rate parsing falls back and clamps"""
+        self.assertEqual(parse_sample_rate("0.25"), 0.25)
+        self.assertEqual(parse_sample_rate("1%"), 0.0)
+        self.assertEqual(parse_sample_rate("5"), 1.0)
+        self.assertEqual(parse_sample_rate("-1"), 0.0)
+
     def test_404_handler(self):
         """Test 404 error handler"""
         response = self.app.get('/nonexistent-endpoint')